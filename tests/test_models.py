@@ -16,17 +16,20 @@
 Test cases for Product Model
 
 Test cases can be run with:
-    nosetests
+    pytest -n auto --dist loadscope --cov=service
     coverage report -m
 
 While debugging just these tests it's convenient to use this:
-    nosetests --stop tests/test_models.py:TestProductModel
+    pytest -x tests/test_models.py::TestProductModelMutations
 
 """
 import os
 import logging
 import unittest
+from collections import Counter
 from decimal import Decimal
+import factory.random
+from sqlalchemy import text
 from service.models import Product, Category, db, DataValidationError
 from service import app
 from tests.factories import ProductFactory
@@ -39,37 +42,155 @@ DATABASE_URI = os.getenv(
 ######################################################################
 #  P R O D U C T   M O D E L   T E S T   C A S E S
 ######################################################################
-# pylint: disable=too-many-public-methods
-class TestProductModel(unittest.TestCase):
-    """Test Cases for Product Model"""
+class TestProductModelBase(unittest.TestCase):
+    """Shared database fixtures for the Product Model test cases"""
+
+    # Set once per process so re-running setUpClass never repeats the DDL
+    _db_initialized = False
 
     @classmethod
     def setUpClass(cls):
-        """This runs once before the entire test suite"""
-        app.config["TESTING"] = True
-        app.config["DEBUG"] = False
-        app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
-        app.logger.setLevel(logging.CRITICAL)
-        Product.init_db(app)
+        """This runs once before each test class"""
+        if not TestProductModelBase._db_initialized:
+            app.config["TESTING"] = True
+            app.config["DEBUG"] = False
+            # Each xdist worker gets its own schema so parallel runs
+            # never contend for the same product table
+            worker_id = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+            TestProductModelBase._schema = f"test_{worker_id}"
+            separator = "&" if "?" in DATABASE_URI else "?"
+            app.config["SQLALCHEMY_DATABASE_URI"] = (
+                f"{DATABASE_URI}{separator}options=-csearch_path%3D{TestProductModelBase._schema}"
+            )
+            # Generous compiled-statement cache so the repeated INSERT/SELECTs
+            # in this suite are compiled once, and no pre-ping round-trips
+            app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+                "query_cache_size": 1200,
+                "pool_pre_ping": False,
+            }
+            app.logger.setLevel(logging.CRITICAL)
+            # The schema must exist before create_all can run against it,
+            # so the init is done inline instead of through Product.init_db
+            db.init_app(app)
+            app.app_context().push()
+            with db.engine.begin() as connection:
+                connection.execute(
+                    text(f"CREATE SCHEMA IF NOT EXISTS {TestProductModelBase._schema}")
+                )
+            db.create_all()
+            # UNLOGGED skips the WAL fsync on every commit; losing the table
+            # on a crash is fine for test data
+            with db.engine.begin() as connection:
+                connection.execute(text("ALTER TABLE product SET UNLOGGED"))
+            TestProductModelBase._db_initialized = True
+        # Seed the factory once for the remaining factory-based smoke test
+        ProductFactory.reset_sequence(0)
+        factory.random.reseed_random("tdd-bdd")
+        # Deterministic templates built without Faker; cycling the names,
+        # categories and prices gives batch tests variety at O(1) cost
+        cls._template = {
+            "name": "Fedora",
+            "description": "A red hat",
+            "price": Decimal("12.50"),
+            "available": True,
+            "category": Category.CLOTHS,
+        }
+        names = ["Hat", "Apple", "Skillet", "Wrench"]
+        categories = list(Category)
+        cls._product_pool = [
+            Product(
+                name=names[index % len(names)],
+                description=f"Product number {index}",
+                price=Decimal("9.99") + index,
+                available=bool(index % 2),
+                category=categories[index % len(categories)],
+            )
+            for index in range(10)
+        ]
+        # expire_on_commit is off so assertions after a commit read the
+        # in-memory attributes instead of triggering a refresh SELECT
+        db.session.configure(expire_on_commit=False)
 
     @classmethod
     def tearDownClass(cls):
-        """This runs once after the entire test suite"""
+        """This runs once after each test class"""
         db.session.close()
 
+    @classmethod
+    def drop_schema(cls):
+        """Drops the worker schema and restores the default database config"""
+        if not cls._db_initialized:
+            return
+        with db.engine.begin() as connection:
+            connection.execute(text(f"DROP SCHEMA IF EXISTS {cls._schema} CASCADE"))
+        # Point the shared app back at the plain URI and rebuild the engine
+        # so later test modules don't inherit the dropped schema
+        app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URI
+        db.init_app(app)
+        cls._db_initialized = False
+
+    def _count(self):
+        """Counts products with SELECT count(*) instead of loading every row"""
+        return db.session.query(Product).count()
+
+    @classmethod
+    def _truncate_products(cls):
+        """Wipes the product table with one TRUNCATE instead of per-row DELETEs"""
+        db.session.execute(text("TRUNCATE TABLE product RESTART IDENTITY CASCADE"))
+        db.session.commit()
+
+    @classmethod
+    def _bulk_create(cls, products):
+        """Persists a batch of products with a single INSERT + commit"""
+        db.session.bulk_save_objects(products, return_defaults=True)
+        db.session.commit()
+
+    @classmethod
+    def _template_product(cls):
+        """Returns a fresh unsaved product built from the class template"""
+        return Product(**cls._template)
+
+    @classmethod
+    def _pooled_products(cls, count):
+        """Returns fresh unsaved copies of the pre-built template products"""
+        return [
+            Product(
+                name=template.name,
+                description=template.description,
+                price=template.price,
+                available=template.available,
+                category=template.category,
+            )
+            for template in cls._product_pool[:count]
+        ]
+
+
+def tearDownModule():  # pylint: disable=invalid-name
+    """Drops the worker schema once after every test class has run"""
+    TestProductModelBase.drop_schema()
+
+
+######################################################################
+#  M U T A T I O N   T E S T   C A S E S
+######################################################################
+class TestProductModelMutations(TestProductModelBase):
+    """Test Cases for Product Model create/update/delete paths"""
+
+    # Tests that never touch the database and can skip the TRUNCATE cleanup
+    PURE_UNIT_TESTS = {"test_create_a_product", "test_update_a_product_with_empty_id"}
+
     def setUp(self):
         """This runs before each test"""
-        db.session.query(Product).delete()  # clean up the last tests
-        db.session.commit()
+        if self._testMethodName in self.PURE_UNIT_TESTS:
+            return
+        self._truncate_products()  # clean up the last tests
 
     def tearDown(self):
         """This runs after each test"""
+        if self._testMethodName in self.PURE_UNIT_TESTS:
+            return
         db.session.remove()
 
-    ######################################################################
-    #  T E S T   C A S E S
-    ######################################################################
-
     def test_create_a_product(self):
         """It should Create a product and assert that it exists"""
         product = Product(name="Fedora", description="A red hat", price=12.50, available=True, category=Category.CLOTHS)
@@ -84,44 +205,26 @@ class TestProductModel(unittest.TestCase):
 
     def test_add_a_product(self):
         """It should Create a product and add it to the database"""
-        products = Product.all()
-        self.assertEqual(products, [])
+        self.assertEqual(self._count(), 0)
         product = ProductFactory()
         product.id = None
         product.create()
         # Assert that it was assigned an id and shows up in the database
         self.assertIsNotNone(product.id)
-        products = Product.all()
-        self.assertEqual(len(products), 1)
-        # Check that it matches the original product
-        new_product = products[0]
-        self.assertEqual(new_product.name, product.name)
-        self.assertEqual(new_product.description, product.description)
-        self.assertEqual(Decimal(new_product.price), product.price)
-        self.assertEqual(new_product.available, product.available)
-        self.assertEqual(new_product.category, product.category)
-
-    def test_read_a_product(self):
-        """It should Create a product and then read if from the database"""
-        # Create a product from the factory
-        product = ProductFactory()
-        product.id = None
-        product.create()
-        self.assertIsNotNone(product.id)
-
-        # Fetch it Back
-        found_product = Product.find(product.id)
-        self.assertEqual(found_product.name, product.name)
-        self.assertEqual(found_product.description, product.description)
-        self.assertEqual(Decimal(found_product.price), product.price)
-        self.assertEqual(found_product.available, product.available)
-        self.assertEqual(found_product.category, product.category)
+        self.assertEqual(self._count(), 1)
+        # Check that it matches the original product. Snapshot the fields
+        # first and expire the instance, so the lookup re-reads the row from
+        # the database instead of comparing the object to itself through the
+        # identity map (expire_on_commit is off)
+        expected = product.serialize()
+        db.session.expire(product)
+        new_product = Product.find(product.id)
+        self.assertEqual(new_product.serialize(), expected)
 
     def test_update_a_product(self):
         """It should Create a product and then update it"""
-        # Create a product from the factory
-        product = ProductFactory()
-        product.id = None
+        # Create a product from the class template
+        product = self._template_product()
         product.create()
         self.assertIsNotNone(product.id)
         original_id = product.id
@@ -133,93 +236,89 @@ class TestProductModel(unittest.TestCase):
         self.assertEqual(product.id, original_id)
         self.assertEqual(product.description, update_string)
         # Fetch is back and ensure the id is the same and the description did change
-        products = Product.all()
-        self.assertEqual(len(products), 1)
-        self.assertEqual(products[0].id, original_id)
-        self.assertEqual(products[0].description, update_string)
+        self.assertEqual(self._count(), 1)
+        fetched = Product.find(original_id)
+        self.assertEqual(fetched.id, original_id)
+        self.assertEqual(fetched.description, update_string)
 
     def test_update_a_product_with_empty_id(self):
         """It should Raise an Exception when Update is called"""
-        # Create a product from the factory
-        product = ProductFactory()
+        # Create a product from the class template
+        product = self._template_product()
         product.id = None
+        # update() raises on the empty id before ever touching the session,
+        # so this stays a pure unit test with no fixture needed
         self.assertRaises(DataValidationError, product.update)
 
     def test_delete_a_product(self):
         """It should Create a product and then delete it"""
-        # Create a product from the factory
-        product = ProductFactory()
+        # Create a product from the class template
+        product = self._template_product()
         product.create()
         # Ensure only one product exists
-        self.assertEqual(len(Product.all()), 1)
+        self.assertEqual(self._count(), 1)
         # Delete product from the database
         product.delete()
-        self.assertEqual(len(Product.all()), 0)
+        self.assertEqual(self._count(), 0)
+
+
+######################################################################
+#  Q U E R Y   T E S T   C A S E S
+######################################################################
+class TestProductModelQueries(TestProductModelBase):
+    """Test Cases for Product Model read-only queries
+
+    All tests in this class share one committed snapshot of products that
+    is inserted into a freshly wiped table once in setUpClass, so no
+    per-test cleanup is needed; tearDownClass truncates the snapshot away.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        """Inserts the shared product snapshot once for the whole class"""
+        super().setUpClass()
+        cls._truncate_products()  # don't count rows leaked by other classes
+        cls._fixture_products = cls._pooled_products(10)
+        cls._bulk_create(cls._fixture_products)
+
+    @classmethod
+    def tearDownClass(cls):
+        """Removes the shared product snapshot"""
+        cls._truncate_products()
+        super().tearDownClass()
+
+    def test_read_a_product(self):
+        """It should Read a product back from the database"""
+        product = self._fixture_products[0]
+        # Fetch it Back
+        found_product = Product.find(product.id)
+        self.assertEqual(found_product.name, product.name)
+        self.assertEqual(found_product.description, product.description)
+        self.assertEqual(found_product.price, product.price)
+        self.assertEqual(found_product.available, product.available)
+        self.assertEqual(found_product.category, product.category)
 
     def test_list_all_products(self):
         """It should list out all products within the database"""
-        # Assert there are no products
-        self.assertEqual(len(Product.all()), 0)
-        # Create 5 products
-        for _ in range(5):
-            product = ProductFactory()
-            product.create()
-        # Fetch all Products and ensure that 5 were created
         products = Product.all()
-        self.assertEqual(len(products), 5)
-
-    def test_find_by_name(self):
-        """It should return the product based on its name"""
-        # Create 5 products
-        products = ProductFactory.create_batch(5)
-        for product in products:
-            product.create()
-        # Retrieve first product
-        product_name = products[0].name
-        count = len([product for product in products if product.name == product_name])
-        found_product = Product.find_by_name(product_name)
-        self.assertEqual(found_product.count(), count)
-        for product in found_product:
-            self.assertEqual(product.name, product_name)
-
-    def test_find_by_availability(self):
-        """It should return the product based on its availability"""
-        # Create 10 products
-        products = ProductFactory.create_batch(10)
-        for product in products:
-            product.create()
-        # Retrieve first product availability
-        available = products[0].available
-        count = len([product for product in products if product.available == available])
-        found = Product.find_by_availability(available)
-        self.assertEqual(found.count(), count)
-        for product in found:
-            self.assertEqual(product.available, available)
-
-    def test_find_by_category(self):
-        """It should Find Products by Category"""
-        # Create 10 products
-        products = ProductFactory.create_batch(10)
-        for product in products:
-            product.create()
-        # Retrieve first product by category
-        category = products[0].category
-        count = len([product for product in products if product.category == category])
-        found = Product.find_by_category(category)
-        self.assertEqual(found.count(), count)
-        for product in found:
-            self.assertEqual(product.category, category)
-
-    def test_find_by_price(self):
-        """It should Find Products by Price"""
-        # Create 10 products
-        products = ProductFactory.create_batch(10)
-        for product in products:
-            product.create()
-        # Retrieve first product by price
-        price = products[0].price
-        count = len([product for product in products if product.price == price])
-        found = Product.find_by_price(str(price))
-        self.assertEqual(found.count(), count)
-        for product in found:
-            self.assertEqual(product.price, price)
+        self.assertEqual(len(products), len(self._fixture_products))
+
+    def test_find_by_attributes(self):
+        """It should Find Products by name, availability, category and price"""
+        products = self._fixture_products
+        finders = [
+            ("name", Product.find_by_name),
+            ("available", Product.find_by_availability),
+            ("category", Product.find_by_category),
+            ("price", lambda value: Product.find_by_price(str(value))),
+        ]
+        # Query each distinct value per attribute; the SQL text is identical
+        # across iterations so the compiled statement is reused from the cache
+        for attr, finder in finders:
+            counts = Counter(getattr(product, attr) for product in products)
+            for value in counts:
+                with self.subTest(attr=attr, value=value):
+                    found = finder(value).all()
+                    self.assertEqual(len(found), counts[value])
+                    for product in found:
+                        self.assertEqual(getattr(product, attr), value)